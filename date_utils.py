@@ -1,19 +1,21 @@
 import datetime
 
-def format_date(date_obj):
-    return date_obj.strftime('%Y-%m-%d')
-
 def generate_date_range(start_date, end_date):
-    dates = []
-    delta = datetime.timedelta(days=1)
-    while start_date <= end_date:
-        dates.append(format_date(start_date))
-        start_date += delta
-    return {"$in": dates}
+    days = (end_date - start_date).days + 1
+    return {"$in": [(start_date + datetime.timedelta(days=i)).isoformat() for i in range(days)]}
+
+# Result of the last generate_recent_dates call, keyed by (today, days)
+_RECENT_CACHE = {}
 
 def generate_recent_dates(days=5):
-    dates = []
-    for i in range(days):
-        date_obj = datetime.datetime.now() - datetime.timedelta(days=i)
-        dates.append(format_date(date_obj))
-    return {"$in": dates}
+    # The result only changes at midnight, so warm containers reuse it all day
+    today = datetime.date.today()
+    key = (today, days)
+    cached = _RECENT_CACHE.get(key)
+    if cached is not None:
+        return cached
+    # Most recent date first
+    result = {"$in": [(today - datetime.timedelta(days=i)).isoformat() for i in range(days)]}
+    _RECENT_CACHE.clear()
+    _RECENT_CACHE[key] = result
+    return result
@@ -1,17 +1,21 @@
 import os
+import time
 import logging
-from snowflake.snowpark import Session
-from pinecone import Pinecone
-from snowflake.snowpark.functions import col
+from typing import TYPE_CHECKING
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import LRUCache, TTLCache
 
+# The Snowpark and Pinecone clients are imported where they are used, so that
+# importing this module does not load them until a connection is needed
+if TYPE_CHECKING:
+    from snowflake.snowpark import Session
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG) 
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+logger = logging.getLogger(__name__)
+
+# The clients and caches in this module live for the container, so warm invocations reuse them
 
 
 def initialize_pinecone():
@@ -26,6 +30,8 @@ def initialize_pinecone():
     logger.info("Pinecone API Key retrieved successfully.")
     
     try:
+        from pinecone import Pinecone
+
         # Initialize Pinecone client
         pc = Pinecone(api_key=pinecone_api_key)
         # Connect to the 'agent-alpha' index
@@ -33,97 +39,188 @@ def initialize_pinecone():
         logger.info("Pinecone initialized successfully and connected to 'agent-alpha' index.")
         return pinecone_index
     except Exception as e:
-        logger.error(f"Failed to initialize Pinecone: {str(e)}")
+        logger.error("Failed to initialize Pinecone: %s", e)
         raise
 
 
 
+# Snowflake connection parameters, read from the environment once at import
+_SNOWFLAKE_CONNECTION_PARAMETERS = {
+    "account": f"{os.getenv('SNOWFLAKE_ACCOUNT')}.{os.getenv('SNOWFLAKE_REGION')}",
+    "user": os.getenv('SNOWFLAKE_USER'),
+    "password": os.getenv('SNOWFLAKE_PASSWORD'),
+    "role": os.getenv('SNOWFLAKE_ROLE'),
+    "warehouse": os.getenv('SNOWFLAKE_WAREHOUSE'),
+    "database": os.getenv('SNOWFLAKE_DATABASE'),
+    "schema": os.getenv('SNOWFLAKE_SCHEMA'),
+    # Keep the cached session from expiring while idle
+    "client_session_keep_alive": True,
+}
+
+_MISSING_SNOWFLAKE_VARIABLES = [
+    name for name in ("SNOWFLAKE_ACCOUNT", "SNOWFLAKE_REGION", "SNOWFLAKE_USER", "SNOWFLAKE_PASSWORD")
+    if not os.getenv(name)
+]
+if _MISSING_SNOWFLAKE_VARIABLES:
+    logger.error("Missing Snowflake environment variables: %s", ', '.join(_MISSING_SNOWFLAKE_VARIABLES))
+
 def create_snowflake_session():
     """
     Establishes and returns a Snowflake Snowpark Session.
     """
+    if _MISSING_SNOWFLAKE_VARIABLES:
+        raise ValueError(f"Snowflake environment variables are missing: {', '.join(_MISSING_SNOWFLAKE_VARIABLES)}")
    
     try:
-        connection_parameters = {
-            "account": f"{os.getenv('SNOWFLAKE_ACCOUNT')}.{os.getenv('SNOWFLAKE_REGION')}",
-            "user": os.getenv('SNOWFLAKE_USER'),
-            "password": os.getenv('SNOWFLAKE_PASSWORD'),
-            "role": os.getenv('SNOWFLAKE_ROLE'),
-            "warehouse": os.getenv('SNOWFLAKE_WAREHOUSE'),
-            "database": os.getenv('SNOWFLAKE_DATABASE'),
-            "schema": os.getenv('SNOWFLAKE_SCHEMA'),
-        }
-        
         # Create Snowpark session
-        logger.info(f"Connection parameters: {connection_parameters}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Never log the password
+            logger.debug("Connection parameters: %s", {k: v for k, v in _SNOWFLAKE_CONNECTION_PARAMETERS.items() if k != "password"})
         # Establish a session with Snowflake
+        from snowflake.snowpark import Session
         logger.info("Establishing Snowflake session...")
-        snowflake_session = Session.builder.configs(connection_parameters).create()
+        snowflake_session = Session.builder.configs(_SNOWFLAKE_CONNECTION_PARAMETERS).create()
         logger.info("Connection to Snowflake successful!")
         return snowflake_session
     except Exception as e:
-        logger.error(f"Failed to connect to Snowflake: {str(e)}")
+        logger.error("Failed to connect to Snowflake: %s", e)
         raise
 
 
+# Pinecone index and Snowflake session, created on first use
+_PINECONE_INDEX = None
+_SF_SESSION = None
+_SF_SESSION_LAST_USED = 0.0
+
+# A session idle for longer than this is checked with a cheap query before reuse
+_SF_PING_AFTER_SECONDS = 300
+
+def get_pinecone_index():
+    """
+    Returns the cached Pinecone index, initializing it on first use.
+    """
+    global _PINECONE_INDEX
+    if _PINECONE_INDEX is None:
+        _PINECONE_INDEX = initialize_pinecone()
+    return _PINECONE_INDEX
+
+def get_snowflake_session():
+    """
+    Returns the cached Snowflake session, reconnecting if it has been closed
+    or fails a liveness check after sitting idle.
+    """
+    global _SF_SESSION, _SF_SESSION_LAST_USED
+    now = time.monotonic()
+    if _SF_SESSION is not None and now - _SF_SESSION_LAST_USED > _SF_PING_AFTER_SECONDS:
+        try:
+            _SF_SESSION.sql("SELECT 1").collect()
+        except Exception as e:
+            logger.warning("Cached Snowflake session failed liveness check, reconnecting: %s", e)
+            _SF_SESSION = None
+    if _SF_SESSION is None or _SF_SESSION.connection.is_closed():
+        _SF_SESSION = create_snowflake_session()
+    _SF_SESSION_LAST_USED = now
+    return _SF_SESSION
 
 
+
+
+# Maximum number of article IDs bound into a single IN list
+_ID_BATCH_SIZE = 1000
+
+# IN-list sizes with a pre-built statement; batches are padded with '' up to the next size
+# The ID predicate prunes best when STOCK_NEWS is clustered by ID (ALTER TABLE STOCK_NEWS CLUSTER BY (ID))
+_ID_BUCKET_SIZES = (8, 64, 512, _ID_BATCH_SIZE)
+_ARTICLE_QUERIES = {
+    size: f"""
+            SELECT ID, SITE, URL
+            FROM STOCK_NEWS
+            WHERE ID IN ({', '.join(['?'] * size)})
+            """
+    for size in _ID_BUCKET_SIZES
+}
+
+# Site and URL of previously fetched articles
+_ARTICLE_CACHE = LRUCache(maxsize=10_000)
+
+# article_ids that are not in STOCK_NEWS (e.g. deleted articles); they are not
+# queried again until their entry expires
+_MISSING_ARTICLE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+
 # Function to fetch article information from Snowflake
-def get_article_info_from_snowflake(article_ids, session: Session):
+def get_article_info_from_snowflake(article_ids, session: "Session"):
     """
     Fetches site and URL information for the given article_ids from Snowflake without using pandas.
     
     Parameters:
-    - article_ids (str, set, or list): A set or list of article IDs.
+    - article_ids (str, set, list, or tuple): A collection of article IDs.
     - session (Session): An active Snowflake session.
     
     Returns:
     - dict: A dictionary mapping each article_id to its corresponding site and URL.
     """
     try:
-        if isinstance(article_ids, (set, list)):
-            article_ids_list = [aid.strip() for aid in article_ids]
-        elif isinstance(article_ids, str):
-            article_ids_list = [aid.strip() for aid in article_ids.split(',') if aid.strip()]
-        else:
-            logger.error("article_ids must be a string, set, or list.")
+        if isinstance(article_ids, str):
+            article_ids = article_ids.split(',')
+        elif not isinstance(article_ids, (set, list, tuple)):
+            logger.error("article_ids must be a string, set, list, or tuple.")
             return {}
 
-        # Remove any empty strings from the list
-        article_ids_list = [aid for aid in article_ids_list if aid]
+        # Strip whitespace, drop empty strings and remove duplicates; sorted for stable SQL
+        article_ids_list = sorted({aid.strip() for aid in article_ids if aid.strip()})
+        if not article_ids_list:
+            return {}
+
+        # Serve known article_ids from the cache and skip ones recently confirmed missing
+        article_info = {aid: _ARTICLE_CACHE[aid] for aid in article_ids_list if aid in _ARTICLE_CACHE}
+        article_ids_list = [aid for aid in article_ids_list if aid not in article_info and aid not in _MISSING_ARTICLE_CACHE]
+        if not article_ids_list:
+            logger.info("Served all %d known article_ids from cache.", len(article_info))
+            return article_info
 
         # Log the article IDs being queried
-        logger.info(f"Searching for article_ids: {article_ids_list}")
-        
-        # Construct the SQL query with placeholders
-        placeholders = ', '.join([f"'{aid}'" for aid in article_ids_list])
-        query = f"""
-        SELECT ID, SITE, URL
-        FROM STOCK_NEWS
-        WHERE ID IN ({placeholders})
-        """
+        logger.info("Searching for %d article_ids (%d served from cache).", len(article_ids_list), len(article_info))
+        logger.debug("Searching for article_ids: %s", article_ids_list)
         
-        logger.debug(f"Executing query: {query}")
-        
-        # Execute the query and fetch results
-        result = session.sql(query).collect()
-        logger.info(f"Fetched {len(result)} rows from Snowflake.")
+        # Query in batches so a large IN list never becomes one huge statement
+        row_count = 0
+        for start in range(0, len(article_ids_list), _ID_BATCH_SIZE):
+            batch = article_ids_list[start:start + _ID_BATCH_SIZE]
+
+            # Pick the smallest pre-built query that fits and pad the bind values
+            size = next(size for size in _ID_BUCKET_SIZES if size >= len(batch))
+            query = _ARTICLE_QUERIES[size]
+            batch = batch + [''] * (size - len(batch))
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Executing query: %s", query)
+            
+            # Stream the results into the dictionary and the cache
+            for article_id, site, url in session.sql(query, params=batch).to_local_iterator():
+                article_info[article_id] = _ARTICLE_CACHE[article_id] = {'site': site, 'url': url}
+                row_count += 1
+        logger.info("Fetched %d rows from Snowflake.", row_count)
         
-        # Build the dictionary
-        article_info = {}
-        for row in result:
-            article_id = row['ID']
-            site = row['SITE']
-            url = row['URL']
-            article_info[article_id] = {'site': site, 'url': url}
+        # Remember the article_ids that were not found
+        for aid in article_ids_list:
+            if aid not in article_info:
+                _MISSING_ARTICLE_CACHE[aid] = True
         
-        logger.info(f"Constructed article_info dictionary with {len(article_info)} entries.")
+        logger.info("Constructed article_info dictionary with %d entries.", len(article_info))
         return article_info
 
     except Exception as e:
-        logger.error(f"Error fetching article info from Snowflake: {e}")
+        logger.error("Error fetching article info from Snowflake: %s", e)
         return {}
     
+# HTTP session for the Financial Modeling Prep API
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+))
+
 # Gathers price information for the given list of symbols from the Financial Modeling Prep API
 def get_quote_info(symbols):
     """
@@ -144,12 +241,12 @@ def get_quote_info(symbols):
         symbols_str = ",".join(symbols)
         url = f"https://financialmodelingprep.com/api/v3/quote/{symbols_str}?apikey={fmp_api_key}"
 
-        logger.info(f"Fetching quote data from FMP API for symbols: {symbols_str}")
-        response = requests.get(url)
+        logger.info("Fetching quote data from FMP API for symbols: %s", symbols_str)
+        response = _HTTP.get(url, timeout=(3, 10))
         response.raise_for_status()  # Raises HTTPError for bad requests (4xx or 5xx)
 
         data = response.json()
-        logger.debug(f"Received quote data: {data}")
+        logger.debug("Received quote data: %s", data)
 
         # Build a dictionary mapping symbols to their quote data
         quote_info = {}
@@ -164,9 +261,9 @@ def get_quote_info(symbols):
                     'volume': item.get('volume'),
                     'exchange': item.get('exchange')
                 }
-        logger.info(f"Constructed quote_info dictionary with {len(quote_info)} entries.")
+        logger.info("Constructed quote_info dictionary with %d entries.", len(quote_info))
         return quote_info
 
     except Exception as e:
-        logger.error(f"Error fetching quote info from FMP API: {e}")
+        logger.error("Error fetching quote info from FMP API: %s", e)
         return {}
\ No newline at end of file
@@ -1,83 +1,137 @@
 import os
-import json
+import orjson
 import datetime
 import logging
 import base64
-import openai
+import gzip
 import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
-from data_cleaning import clean_empty_arrays_and_objects
-from date_utils import generate_date_range, generate_recent_dates
-from vector_utils import is_valid_vector, create_dense_vector
-from db_utils import initialize_pinecone, get_article_info_from_snowflake, create_snowflake_session, get_quote_info  
+# Configure logging; the Lambda runtime's root handler emits to CloudWatch
+logging.getLogger().setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+# CORS headers
+_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",  # Adjust as needed for security
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, apikey",
+    "Content-Type": "application/json",
+}
+
+# Payload fields that become "$in" metadata filters
+_IN_FILTER_KEYS = ('symbol', 'cat', 'significancescore', 'sentimentscore')
+
+# Upper bound on the search strings embedded and queried per request
+_MAX_SEARCH_STRINGS = 5
+
+# Opt-in, since a gzipped body only reaches the client intact when API Gateway
+# passes base64 bodies through as binary (e.g. binaryMediaTypes on a REST API)
+_GZIP_RESPONSES = os.environ.get("GZIP_RESPONSES", "").lower() in ("1", "true", "yes")
+if _GZIP_RESPONSES:
+    _CORS_HEADERS["Vary"] = "Accept-Encoding"
+
+_GZIP_HEADERS = {**_CORS_HEADERS, "Content-Encoding": "gzip"}
+
+# Response bodies larger than this are gzip-compressed when the client accepts it
+_GZIP_MIN_BYTES = 1024
+
+_PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': _CORS_HEADERS,
+    'body': ''
+}
+
+_METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': _CORS_HEADERS,
+    'body': orjson.dumps('Method Not Allowed').decode()
+}
+
+# The OpenAI, Pinecone and Snowflake client modules and the request helpers are
+# imported on the first POST so that CORS preflight requests on a cold container skip them
+openai = None
+vector_utils = None
+db_utils = None
+date_utils = None
+
+def _load_backends():
+    global openai, vector_utils, db_utils, date_utils
+    if db_utils is None:
+        import date_utils
+        import openai
+        import vector_utils
+        import db_utils
+        # Set OpenAI API key once per container
+        openai.api_key = os.environ.get("OPENAI_API_KEY")
+
+# The loop and executor below live for the container, so warm invocations reuse them
+
+# Event loop shared by every request, so connections opened on it stay usable
+_LOOP = asyncio.new_event_loop()
+
+# Worker threads for the blocking client calls
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+def _run_blocking(func, *args, **kwargs):
+    # Runs a blocking client call on the shared executor and returns an awaitable future
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_EXECUTOR, functools.partial(func, *args, **kwargs))
 
 def lambda_handler(event, context):
-    # Define CORS headers
-    cors_headers = {
-        "Access-Control-Allow-Origin": "*",  # Adjust as needed for security
-        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization, apikey",
-        "Content-Type": "application/json",
-    }
-    
     # Log the event for debugging
-    logger.info(f"Event received: {json.dumps(event)}")
+    logger.debug("Event received: %s", event)
     
     # Extract the HTTP method from the event
     method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method', 'POST')
     
     # Handle OPTIONS method for CORS preflight
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': ''
-        }
+        return _PREFLIGHT_RESPONSE
     
     # Ensure the request method is POST
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': cors_headers,
-            'body': json.dumps('Method Not Allowed')
-        }
+        return _METHOD_NOT_ALLOWED_RESPONSE
     
+    _load_backends()
+    return _LOOP.run_until_complete(_async_handler(event))
+
+async def _async_handler(event):
+    vector_utils.use_persistent_session()
     try:
-        # Initialize Pinecone and get the index
-        pinecone_index = initialize_pinecone()
-        
-        # Create Snowflake session
-        snowflake_session = create_snowflake_session()
-        
-        # Set OpenAI API key
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        if not openai_api_key:
+        # Check OpenAI API key
+        if not openai.api_key:
             logger.error("OpenAI API key is missing in environment variables.")
             raise ValueError("OpenAI API key is missing.")
-        openai.api_key = openai_api_key
         
         # Extract the JSON payload from the request
         body = event.get('body', '{}')
         if event.get('isBase64Encoded', False):
-            body = base64.b64decode(body).decode('utf-8')
-        payload = json.loads(body)
-        logger.info(f"Received payload: {json.dumps(payload)}")
+            body = base64.b64decode(body)
+        payload = orjson.loads(body)
+        logger.info("Received payload with keys: %s", list(payload))
+        logger.debug("Received payload: %s", payload)
         
         # Extract required and optional fields
-        symbol = payload.get('symbol')
-        cat = payload.get('cat')
-        significancescore = payload.get('significancescore')
-        sentimentscore = payload.get('sentimentscore')
         start_date_str = payload.get('start_date')
         end_date_str = payload.get('end_date')
         search_string = payload.get('search_string', '').strip()
+        raw_search_strings = payload.get('search_strings') or []
+        if isinstance(raw_search_strings, str):
+            raw_search_strings = [raw_search_strings]
+        if not isinstance(raw_search_strings, list) or not all(isinstance(s, str) for s in raw_search_strings):
+            return _bad_request("'search_strings' must be a list of strings.")
+        # Drop blanks and duplicates while keeping 'search_string' first
+        search_strings = list(dict.fromkeys(
+            s for s in chain([search_string], (s.strip() for s in raw_search_strings)) if s
+        ))
+        if len(search_strings) > _MAX_SEARCH_STRINGS:
+            return _bad_request(f"At most {_MAX_SEARCH_STRINGS} search strings are allowed.")
         top_k = payload.get('top_k', 3)
-        # Default dimension for 'text-embedding-ada-002' model
-        dimension = 1536
+        # Dimension of the configured embedding model
+        dimension = vector_utils.EMBEDDING_DIMENSION
         
         # Generate dynamic filters for the query
         dynamic_filters = {}
@@ -85,122 +139,122 @@ def lambda_handler(event, context):
         # Handle date range
         if start_date_str and end_date_str:
             try:
-                start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d')
-                end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d')
+                start_date = _parse_date(start_date_str)
+                end_date = _parse_date(end_date_str)
                 if start_date > end_date:
                     raise ValueError("start_date cannot be after end_date.")
-                dynamic_filters["created"] = generate_date_range(start_date, end_date)
+                dynamic_filters["created"] = date_utils.generate_date_range(start_date, end_date)
             except ValueError as ve:
-                logger.error(f"Invalid date format: {ve}")
+                logger.error("Invalid date format: %s", ve)
                 return {
                     'statusCode': 400,
-                    'headers': cors_headers,
-                    'body': json.dumps({'error': f'Invalid date format: {ve}'})
+                    'headers': _CORS_HEADERS,
+                    'body': orjson.dumps({'error': f'Invalid date format: {ve}'}).decode()
                 }
         else:
             # Default to the last 5 days if dates are not provided
-            dynamic_filters["created"] = generate_recent_dates(5)
+            dynamic_filters["created"] = date_utils.generate_recent_dates(5)
         
-        if symbol:
-            dynamic_filters["symbol"] = {"$in": symbol if isinstance(symbol, list) else [symbol]}
-        if cat:
-            dynamic_filters["cat"] = {"$in": list(filter(None, cat))}
-        if significancescore:
-            dynamic_filters["significancescore"] = {"$in": significancescore if isinstance(significancescore, list) else [significancescore]}
-        if sentimentscore:
-            dynamic_filters["sentimentscore"] = {"$in": sentimentscore if isinstance(sentimentscore, list) else [sentimentscore]}
+        # Add the optional "$in" filters; empty values are skipped here so the
+        # filters never need a separate cleaning pass
+        for key in _IN_FILTER_KEYS:
+            value = payload.get(key)
+            if not value:
+                continue
+            if not isinstance(value, list):
+                value = [value]
+            if key == 'cat':
+                value = [item for item in value if item]
+                if not value:
+                    continue
+            dynamic_filters[key] = {"$in": value}
         
-        # Clean the dynamic_filters object
-        clean_empty_arrays_and_objects(dynamic_filters)
+        # Get the Pinecone index and the Snowflake session in the background;
+        # both are independent of the embedding call below
+        pinecone_future = _run_blocking(db_utils.get_pinecone_index)
+        snowflake_future = _run_blocking(db_utils.get_snowflake_session)
         
-        # Handle 'search_string'
-        if search_string:
-            # Generate vector from search string
-            vector = create_dense_vector(search_string)
-            if not vector or not is_valid_vector(vector, dimension):
+        # Handle 'search_string' and 'search_strings'
+        if search_strings:
+            # Generate vectors from the search strings while the connections are being set up;
+            # several search strings are embedded with a single request
+            if len(search_strings) == 1:
+                vector = await vector_utils.create_dense_vector(search_strings[0])
+                vectors = [vector] if vector else None
+            else:
+                vectors = await vector_utils.create_dense_vectors(search_strings)
+            if not vectors or not all(vector_utils.is_valid_vector(vector, dimension) for vector in vectors):
+                # Let the connection calls finish so a failure in them is retrieved, not lost
+                await asyncio.gather(pinecone_future, snowflake_future, return_exceptions=True)
                 return {
                     'statusCode': 500,
-                    'headers': cors_headers,
-                    'body': json.dumps({'error': 'Error generating vector from search string.'})
+                    'headers': _CORS_HEADERS,
+                    'body': orjson.dumps({'error': 'Error generating vector from search string.'}).decode()
                 }
-            logger.info(f"Generated vector of length {len(vector)} from search string.")
-            # Log the first few numbers of the vector
-            logger.info(f"Vector (first 5 elements): {vector[:5]}")
+            logger.info("Generated %d vectors of length %d from search strings.", len(vectors), dimension)
+            # Log the first few numbers of the first vector
+            logger.info("Vector (first 5 elements): %s", vectors[0][:5])
         else:
-            # Create a zero-filled vector based on 'dimension'
-            vector = [0.0] * dimension
-            logger.info(f"No search string provided. Generated zero vector of dimension {dimension}.")
+            # Use the shared zero-filled vector
+            vectors = [vector_utils.ZERO_VECTOR]
+            logger.info("No search string provided. Using zero vector of dimension %d.", dimension)
         
-        # Perform a query to the 'summaries' namespace
+        # Wait for the connections started above
+        pinecone_index, snowflake_session = await asyncio.gather(pinecone_future, snowflake_future)
+        
+        # Query the 'summaries' namespace once per vector, concurrently
         try:
-            query_results = pinecone_index.query(
-                namespace="summaries",
-                vector=vector,
-                top_k=top_k,
-                include_metadata=True,
-                # filter=dynamic_filters  # Apply dynamic filters if necessary
-            )
-            
-            # Log the entire query_results for debugging
-            logger.debug(f"Full query_results: {json.dumps(query_results, default=str)}")
+            query_results_list = await asyncio.gather(*(
+                _run_blocking(
+                    pinecone_index.query,
+                    namespace="summaries",
+                    vector=vector,
+                    top_k=top_k,
+                    include_metadata=True,
+                    # filter=dynamic_filters  # Apply dynamic filters if necessary
+                )
+                for vector in vectors
+            ))
             
-            # Extract all article_ids and symbols from the matches
-            article_ids_set = set()
-            symbols_set = set()
-            for match in query_results['matches']:
-                metadata = match.get('metadata', {})
-                article_ids_str = metadata.get('article_ids', '')
-                symbol = metadata.get('symbol')
-                if symbol:
-                    symbols_set.add(symbol)
-                if article_ids_str:
-                    # Split the comma-separated string and strip whitespace
-                    article_ids = [aid.strip() for aid in article_ids_str.split(',') if aid.strip()]
-                    article_ids_set.update(article_ids)
-                    logger.debug(f"Extracted article_ids: {article_ids}")
-                else:
-                    logger.warning("No 'article_ids' found in match metadata.")
-            logger.info(f"Total unique article_ids extracted: {len(article_ids_set)}")
-            logger.info(f"Total unique symbols extracted: {symbols_set}")
+            # Extract all article_ids and symbols from the matches; the parsed
+            # article_ids are reused when building the response below
+            matches = _merge_matches(query_results_list, top_k)
+            parsed_article_ids = [_parse_article_ids(match.get('metadata') or {}) for match in matches]
+            article_ids_set = set(chain.from_iterable(parsed_article_ids))
+            symbols_set = {symbol for match in matches if (symbol := (match.get('metadata') or {}).get('symbol'))}
+            logger.info("Total unique article_ids extracted: %d", len(article_ids_set))
+            logger.info("Total unique symbols extracted: %s", symbols_set)
 
             if not article_ids_set:
                 logger.warning("No article_ids found in any of the matches.")
             
-            # Fetch site and url information from Snowflake
-            article_info = get_article_info_from_snowflake(article_ids_set, snowflake_session) if article_ids_set else {}
-            logger.info(f"Fetched article info: {article_info}")
-
-            # Fetch quote information for symbols
-            quote_info = get_quote_info(list(symbols_set)) if symbols_set else {}
-            logger.info(f"Fetched quote info: {quote_info}")
-
-            # Convert QueryResponse to a serializable dictionary and modify metadata
-            serializable_results = {
-                "matches": [],
-                "namespace": query_results['namespace'],
-            }
+            # Fetch site and url information from Snowflake and quote information
+            # for symbols concurrently
+            article_info, quote_info = await asyncio.gather(
+                _run_blocking(db_utils.get_article_info_from_snowflake, article_ids_set, snowflake_session) if article_ids_set else _empty_result(),
+                _run_blocking(db_utils.get_quote_info, list(symbols_set)) if symbols_set else _empty_result(),
+            )
+            logger.info("Fetched info for %d articles and %d quotes.", len(article_info), len(quote_info))
+            logger.debug("Fetched article info: %s", article_info)
+            logger.debug("Fetched quote info: %s", quote_info)
 
-            for match in query_results['matches']:
-                match_id = match['id']
-                score = match['score']
-                metadata = match.get('metadata', {})
-                article_ids_str = metadata.get('article_ids', '')
+            # Modify the metadata of each match in place; the matches are
+            # serialized directly by orjson via _serialize_match
+            for match, article_ids in zip(matches, parsed_article_ids):
+                metadata = match.get('metadata')
+                if metadata is None:
+                    metadata = match['metadata'] = {}
                 symbol = metadata.get('symbol')
                 
-                # Process article_ids
-                if article_ids_str:
-                    article_ids = [aid.strip() for aid in article_ids_str.split(',') if aid.strip()]
-                    # Build a dict mapping article_id to its site and url
-                    articles_data = {}
-                    for aid in article_ids:
-                        if aid in article_info:
-                            articles_data[aid] = article_info[aid]
-                        else:
-                            articles_data[aid] = {'site': None, 'url': None}
-                    # Replace 'article_ids' in metadata with articles_data
-                    metadata['article_ids'] = articles_data
-                else:
-                    metadata['article_ids'] = {}
+                # Build a dict mapping article_id to its site and url
+                articles_data = {}
+                for aid in article_ids:
+                    if aid in article_info:
+                        articles_data[aid] = article_info[aid]
+                    else:
+                        articles_data[aid] = {'site': None, 'url': None}
+                # Replace 'article_ids' in metadata with articles_data
+                metadata['article_ids'] = articles_data
 
                 # Add quote data to metadata
                 if symbol and symbol in quote_info:
@@ -208,53 +262,124 @@ def lambda_handler(event, context):
                 else:
                     metadata['quote'] = {}
 
-                # Append the match to serializable_results
-                serializable_results['matches'].append({
-                    "id": match_id,
-                    "score": score,
-                    "metadata": metadata
-                })
-
             # Prepare the response body
             response_body = {
-                "summaries": serializable_results
+                "summaries": {
+                    "matches": matches,
+                    "namespace": query_results_list[0]['namespace'],
+                }
             }
 
+            # Serialize the response body once; the log and the response share it
+            body_bytes = orjson.dumps(response_body, default=_serialize_match)
+
             # Log the response body
-            logger.info(f"Response Body: {json.dumps(response_body)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response Body: %s", body_bytes.decode())
 
         except Exception as e:
-            logger.error(f"Error querying 'summaries' namespace: {str(e)}")
+            logger.error("Error querying 'summaries' namespace: %s", e)
             return {
                 'statusCode': 500,
-                'headers': cors_headers,
-                'body': json.dumps({'error': f"Error querying 'summaries' namespace: {str(e)}"})
+                'headers': _CORS_HEADERS,
+                'body': orjson.dumps({'error': f"Error querying 'summaries' namespace: {str(e)}"}).decode()
             }
         
-        # Close the Snowflake session
-        try:
-            snowflake_session.close()
-            logger.info("Snowflake session closed successfully.")
-        except Exception as e:
-            logger.error(f"Error closing Snowflake session: {str(e)}")
-        
+        if _GZIP_RESPONSES and len(body_bytes) > _GZIP_MIN_BYTES and _accepts_gzip(event):
+            return {
+                'statusCode': 200,
+                'headers': _GZIP_HEADERS,
+                'body': base64.b64encode(gzip.compress(body_bytes, compresslevel=1)).decode(),
+                'isBase64Encoded': True
+            }
         return {
             'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(response_body)
+            'headers': _CORS_HEADERS,
+            'body': body_bytes.decode()
         }
         
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.error("Invalid JSON payload.")
         return {
             'statusCode': 400,
-            'headers': cors_headers,
-            'body': json.dumps({'error': 'Invalid JSON payload.'})
+            'headers': _CORS_HEADERS,
+            'body': orjson.dumps({'error': 'Invalid JSON payload.'}).decode()
         }
     except Exception as e:
-        logger.error(f"An error occurred: {str(e)}")
+        logger.error("An error occurred: %s", e)
         return {
             'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps('Internal Server Error')
+            'headers': _CORS_HEADERS,
+            'body': orjson.dumps('Internal Server Error').decode()
         }
+
+def _accepts_gzip(event):
+    headers = event.get('headers') or {}
+    accept_encoding = next((value for key, value in headers.items() if key.lower() == 'accept-encoding'), None)
+    if not accept_encoding:
+        return False
+    # Map each listed coding to its q-value so "gzip;q=0" counts as a refusal
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+def _parse_date(value):
+    # fromisoformat is the fast path for canonical YYYY-MM-DD; anything else goes
+    # through strptime, so unpadded dates such as 2024-1-5 are still accepted and
+    # other ISO forms (20240105, 2024-W01-1) are still rejected
+    if len(value) == 10 and value[4] == value[7] == '-':
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+def _merge_matches(query_results_list, top_k):
+    # Keep the best-scoring occurrence of each summary across all queries,
+    # returning at most top_k of them; assumes a higher score is a closer match
+    # (cosine or dotproduct index)
+    if len(query_results_list) == 1:
+        return query_results_list[0]['matches']
+    best_matches = {}
+    for query_results in query_results_list:
+        for match in query_results['matches']:
+            best = best_matches.get(match['id'])
+            if best is None or match['score'] > best['score']:
+                best_matches[match['id']] = match
+    return sorted(best_matches.values(), key=lambda match: match['score'], reverse=True)[:top_k]
+
+def _parse_article_ids(metadata):
+    article_ids = metadata.get('article_ids') or ''
+    # Older records store a comma-separated string; newer ones a native list
+    if isinstance(article_ids, str):
+        article_ids = article_ids.split(',')
+    # Strip whitespace and drop empty IDs, as get_article_info_from_snowflake does
+    return [aid.strip() for aid in article_ids if aid.strip()]
+
+def _serialize_match(match):
+    # Called by orjson for Pinecone match objects; keeps only the fields the client uses
+    try:
+        return {"id": match['id'], "score": match['score'], "metadata": match['metadata']}
+    except (KeyError, TypeError):
+        raise TypeError(f"Type is not JSON serializable: {type(match).__name__}")
+
+def _bad_request(message):
+    logger.error(message)
+    return {
+        'statusCode': 400,
+        'headers': _CORS_HEADERS,
+        'body': orjson.dumps({'error': message}).decode()
+    }
+
+async def _empty_result():
+    return {}
@@ -1,18 +1,66 @@
+import os
+import json
+import types
 import logging
+import hashlib
+import numpy as np
+import orjson
+import aiohttp
 import openai
+from openai import api_requestor
+from cachetools import LRUCache
 
-logger = logging.getLogger()
+logger = logging.getLogger(__name__)
 
-def is_valid_vector(vector, dimension=1536):
-    return (
-        isinstance(vector, list) and 
-        len(vector) == dimension and 
-        all(isinstance(item, (int, float)) for item in vector)
-    )
+# openai 0.28 decodes every API response with the stdlib json module; route
+# its loads through orjson, which parses the float-heavy embedding payloads
+# considerably faster. Everything else still resolves to the stdlib module.
+api_requestor.json = types.SimpleNamespace(**vars(json))
+api_requestor.json.loads = orjson.loads
+
+# Embedding model and vector dimension; both must match the 'agent-alpha' index.
+# text-embedding-3 models can return shortened embeddings (e.g. 512 dimensions),
+# which shrinks the query payload sent to Pinecone.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1536"))
+
+# Query vector used when no search string is given; built once per container
+ZERO_VECTOR = [0.0] * EMBEDDING_DIMENSION
+
+# The cache and session below live for the container, so warm invocations reuse them
 
-def create_dense_vector(input_text, model="text-embedding-ada-002"):
+# Embeddings of previously seen texts, keyed by a SHA-256 digest of (model, text)
+_EMBEDDING_CACHE = LRUCache(maxsize=1024)
+
+# aiohttp session for the OpenAI API, reused for its keep-alive connections
+_OPENAI_SESSION = None
+
+def use_persistent_session():
+    """
+    Makes the OpenAI SDK send async requests through a long-lived aiohttp session.
+    Must be called from inside the event loop the session should be bound to.
+    """
+    global _OPENAI_SESSION
+    if _OPENAI_SESSION is None or _OPENAI_SESSION.closed:
+        _OPENAI_SESSION = aiohttp.ClientSession()
+    openai.aiosession.set(_OPENAI_SESSION)
+
+def is_valid_vector(vector, dimension=EMBEDDING_DIMENSION):
+    if not isinstance(vector, list):
+        return False
+    try:
+        arr = np.asarray(vector)
+    except ValueError:
+        return False
+    # One numeric dtype check instead of an isinstance call per element
+    return arr.ndim == 1 and arr.size == dimension and arr.dtype.kind in "biuf"
+
+async def create_dense_vector(input_text, model=EMBEDDING_MODEL):
     """
     Creates an embedding for the given input text using OpenAI's embedding model.
+    The request is made with the SDK's native async client, so the caller's event
+    loop stays free while it is in flight. Embeddings of single strings are cached
+    in memory for the life of the container.
 
     Parameters:
     input_text (str or list): The text (or list of texts) to embed.
@@ -22,14 +70,60 @@ def create_dense_vector(input_text, model="text-embedding-ada-002"):
     list: The embedding vector.
     """
     try:
-        # Send the embedding request to the API
-        response = openai.Embedding.create(
-            input=input_text,
-            model=model
-        )
-        # Extract the embedding vector from the response
-        embedding = response['data'][0]['embedding']
-        return embedding
+        if isinstance(input_text, str):
+            return await _cached_embedding(input_text, model)
+        return (await _request_embeddings(input_text, model))[0]
+    except Exception as e:
+        logger.error("Error creating dense vector: %s", e)
+        return None
+
+async def create_dense_vectors(input_texts, model=EMBEDDING_MODEL):
+    """
+    Creates embeddings for several texts with a single request to OpenAI's embedding model.
+    Texts already in the embedding cache are not sent; only the rest are embedded.
+
+    Parameters:
+    input_texts (list): The texts to embed.
+    model (str): The model to use for creating embeddings.
+
+    Returns:
+    list: The embedding vectors, in the same order as input_texts.
+    """
+    try:
+        keys = [_cache_key(input_text, model) for input_text in input_texts]
+        embeddings = [_EMBEDDING_CACHE.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fetched = await _request_embeddings([input_texts[i] for i in missing], model)
+            for i, embedding in zip(missing, fetched):
+                embeddings[i] = _EMBEDDING_CACHE[keys[i]] = embedding
+        return embeddings
     except Exception as e:
-        logger.error(f"Error creating dense vector: {str(e)}")
+        logger.error("Error creating dense vectors: %s", e)
         return None
+
+async def _cached_embedding(input_text, model):
+    key = _cache_key(input_text, model)
+    embedding = _EMBEDDING_CACHE.get(key)
+    if embedding is None:
+        # Failed requests raise and are therefore not cached
+        embedding = _EMBEDDING_CACHE[key] = (await _request_embeddings(input_text, model))[0]
+    return embedding
+
+def _cache_key(input_text, model):
+    return hashlib.sha256(f"{model}\0{input_text}".encode()).digest()
+
+async def _request_embeddings(input_text, model):
+    params = {}
+    if model.startswith("text-embedding-3"):
+        # Ask for embeddings shortened to the index dimension
+        params["dimensions"] = EMBEDDING_DIMENSION
+    # Send the embedding request to the API
+    response = await openai.Embedding.acreate(
+        input=input_text,
+        model=model,
+        **params
+    )
+    # Extract the embedding vectors from the response in input order
+    data = sorted(response['data'], key=lambda item: item['index'])
+    return [item['embedding'] for item in data]